@@ -8,14 +8,25 @@ Usage:
   python staging/copilot-test-loop.py --loop 5           # Run 5 rounds with shuffled queries
   python staging/copilot-test-loop.py --loop 0           # Run forever until Ctrl+C
   python staging/copilot-test-loop.py --failing           # Re-run only previously failing queries
+
+Load profiles (capacity planning):
+  python staging/copilot-test-loop.py --profile ramp --peak-rps 4          # Linear ramp 0.5 -> 4 RPS
+  python staging/copilot-test-loop.py --profile step --rps-steps 1,2,4,8   # Stepped plateaus
+  python staging/copilot-test-loop.py --profile spike --peak-rps 6         # Baseline, spike, recovery
+  python staging/copilot-test-loop.py --profile ramp --slo-p95 8000        # Custom p95 SLO (ms)
+  python staging/copilot-test-loop.py --self-check                         # Verify knee/SLO logic offline
 """
 
 import argparse
+import itertools
 import json
+import math
 import os
 import random
 import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from urllib.request import Request, urlopen
 from urllib.error import URLError, HTTPError
@@ -26,6 +37,16 @@ RESULTS_DIR = os.path.join(os.path.dirname(__file__), "copilot-test-results")
 TIMEOUT = 45  # seconds per request
 DELAY = 2.0   # seconds between requests (be nice to Netlify)
 
+# -- Load Profile Defaults -------------------------------------------------
+STEP_DURATION = 30     # seconds per load step
+SLO_P95_MS = 15000     # p95 latency SLO for "sustainable" throughput
+SLO_ERROR_RATE = 0.02  # max error rate for "sustainable" throughput
+MAX_WORKERS = 64       # concurrent in-flight requests cap
+KNEE_SCALING = 0.8     # throughput must grow >= 80% of offered load growth
+KNEE_P95_GROWTH = 1.5  # p95 jump (vs previous step) that marks saturation
+KNEE_ERROR_JUMP = 0.05 # error-rate jump (vs previous step) that marks saturation
+LOAD_SEED = 26         # fixed query order so every run and step sees the same mix
+
 # -- Query Bank ------------------------------------------------------------
 # Each query has: category, query text, expected assertions
 # Assertions:
@@ -581,6 +602,330 @@ def save_results(all_results):
     return path
 
 
+# -- Load Profiles ---------------------------------------------------------
+# A profile is a list of steps: {"label", "rps", "duration"}.
+# Load is open-loop: requests are fired on schedule regardless of how many
+# are still in flight, and latency is measured from the scheduled send time,
+# so a saturated backend (or a saturated worker pool) shows up as latency
+# instead of silently slowing the client down.
+
+def ramp_profile(start_rps, peak_rps, steps, duration):
+    """Linear ramp from start_rps to peak_rps over N equal steps."""
+    if steps < 2:
+        return [{"label": "ramp-1", "rps": peak_rps, "duration": duration}]
+    inc = (peak_rps - start_rps) / (steps - 1)
+    return [
+        {"label": f"ramp-{i+1}", "rps": round(start_rps + inc * i, 3), "duration": duration}
+        for i in range(steps)
+    ]
+
+
+def step_profile(rps_steps, duration):
+    """Stepped plateaus at explicit RPS levels."""
+    return [
+        {"label": f"step-{i+1}", "rps": rps, "duration": duration}
+        for i, rps in enumerate(rps_steps)
+    ]
+
+
+def spike_profile(base_rps, peak_rps, duration):
+    """Baseline, sudden spike, then recovery back to baseline.
+
+    The spike is a short burst, so it is marked and never counted as
+    sustainable capacity.
+    """
+    return [
+        {"label": "baseline", "rps": base_rps, "duration": duration},
+        {"label": "spike", "rps": peak_rps, "duration": max(duration // 2, 1), "burst": True},
+        {"label": "recovery", "rps": base_rps, "duration": duration},
+    ]
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers (0 if empty)."""
+    if not values:
+        return 0
+    ordered = sorted(values)
+    rank = max(math.ceil(pct / 100 * len(ordered)) - 1, 0)
+    return ordered[rank]
+
+
+def run_step(step, batch, pool, workers):
+    """Fire one step's requests at its target rate and collect step metrics.
+
+    Every step walks the same query order from the top, so steps are
+    compared on the same query mix.
+    """
+    duration = step["duration"]
+    count = max(round(step["rps"] * duration), 1)
+    rps = count / duration  # actual offered rate after rounding to whole requests
+    query_iter = itertools.cycle(batch)
+    records = []
+    lock = threading.Lock()
+    inflight = [0, 0]  # current, peak
+
+    def fire(q, scheduled):
+        try:
+            response = send_query(q["query"])
+        finally:
+            done_at = time.time()
+            with lock:
+                inflight[0] -= 1
+        with lock:
+            records.append({
+                # Includes time spent queued behind the worker cap
+                "latency_ms": int((done_at - scheduled) * 1000),
+                "error": response.get("_error"),
+                "done_at": done_at,
+            })
+
+    print(f"[{step['label']}] {round(rps, 3):g} RPS x {duration}s ({count} requests)...", end=" ", flush=True)
+    start = time.time()
+    futures = []
+    for i in range(count):
+        scheduled = start + i / rps
+        wait = scheduled - time.time()
+        if wait > 0:
+            time.sleep(wait)
+        with lock:
+            inflight[0] += 1
+            inflight[1] = max(inflight[1], inflight[0])
+        futures.append(pool.submit(fire, next(query_iter), scheduled))
+    for fut in futures:
+        fut.result()
+
+    # Completion rate between first and last success, so the final request's
+    # latency (the drain tail) does not drag throughput below offered load
+    ok = [r["latency_ms"] for r in records if not r["error"]]
+    ok_done = sorted(r["done_at"] for r in records if not r["error"])
+    if len(ok_done) > 1 and ok_done[-1] > ok_done[0]:
+        throughput = (len(ok_done) - 1) / (ok_done[-1] - ok_done[0])
+    else:
+        throughput = len(ok_done) / duration
+    errors = sum(1 for r in records if r["error"])
+    result = {
+        "label": step["label"],
+        "offered_rps": round(rps, 3),
+        "duration_s": duration,
+        "burst": step.get("burst", False),
+        "sent": count,
+        "completed": len(ok),
+        "errors": errors,
+        "error_rate": round(errors / count, 4),
+        "throughput_rps": round(throughput, 3),
+        "p50_ms": percentile(ok, 50),
+        "p90_ms": percentile(ok, 90),
+        "p95_ms": percentile(ok, 95),
+        "p99_ms": percentile(ok, 99),
+        "max_ms": max(ok) if ok else 0,
+        "peak_inflight": inflight[1],
+        "client_saturated": inflight[1] > workers,
+    }
+    print(f"{result['throughput_rps']:g} RPS ok | p95 {result['p95_ms']}ms | "
+          f"err {100*result['error_rate']:.1f}%")
+    if result["client_saturated"]:
+        print(f"    ! {inflight[1]} requests in flight, {workers} workers - requests queued, raise --workers")
+    return result
+
+
+def detect_knee(steps):
+    """Find the first step where throughput stops scaling and p95 or errors jump.
+
+    Only steps with increasing offered load are compared, so spike recovery
+    steps are ignored. Returns the knee step dict or None.
+    """
+    prev = None
+    for s in steps:
+        if prev is not None and s["offered_rps"] <= prev["offered_rps"]:
+            continue
+        if prev is not None:
+            offered_gain = s["offered_rps"] - prev["offered_rps"]
+            tput_gain = s["throughput_rps"] - prev["throughput_rps"]
+            scaling = tput_gain / offered_gain
+            p95_growth = s["p95_ms"] / prev["p95_ms"] if prev["p95_ms"] else None
+            error_jump = s["error_rate"] - prev["error_rate"]
+            if scaling < KNEE_SCALING:
+                trigger = None
+                if p95_growth is not None and p95_growth >= KNEE_P95_GROWTH:
+                    trigger = "p95"
+                elif error_jump >= KNEE_ERROR_JUMP:
+                    trigger = "errors"
+                if trigger:
+                    return dict(
+                        s,
+                        trigger=trigger,
+                        scaling=round(scaling, 3),
+                        p95_growth=round(p95_growth, 2) if p95_growth is not None else None,
+                        error_jump=round(error_jump, 4),
+                    )
+        prev = s
+    return None
+
+
+def capacity_report(steps, slo_p95_ms, slo_error_rate):
+    """Summarize load steps into max sustainable RPS under the latency SLO.
+
+    Only steps before the knee count, and burst steps (the spike) never do.
+    """
+    knee = detect_knee(steps)
+    eligible = steps
+    if knee:
+        eligible = steps[:[s["label"] for s in steps].index(knee["label"])]
+    within_slo = [
+        s for s in eligible
+        if not s.get("burst") and s["completed"]
+        and s["p95_ms"] <= slo_p95_ms and s["error_rate"] <= slo_error_rate
+    ]
+    best = max(within_slo, key=lambda s: s["throughput_rps"]) if within_slo else None
+    return {
+        "slo": {"p95_ms": slo_p95_ms, "max_error_rate": slo_error_rate},
+        "sustainable_rule": "best throughput meeting the SLO, before the knee, excluding burst steps",
+        "max_sustainable_rps": best["throughput_rps"] if best else 0,
+        "max_sustainable_step": best["label"] if best else None,
+        "knee": knee,
+        "steps": steps,
+    }
+
+
+def run_load(profile, queries, workers, results, seed=LOAD_SEED):
+    """Run every step of a load profile, appending each finished step to results.
+
+    Results are appended as they complete so a Ctrl+C still leaves the
+    finished steps available for a partial report.
+    """
+    batch = queries[:]
+    random.Random(seed).shuffle(batch)
+    pool = ThreadPoolExecutor(max_workers=workers)
+    try:
+        for step in profile:
+            results.append(run_step(step, batch, pool, workers))
+    except KeyboardInterrupt:
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    pool.shutdown()
+    return results
+
+
+def self_check():
+    """Check load measurement, knee detection and SLO selection."""
+    global send_query
+
+    def check(cond, msg):
+        if not cond:
+            print(f"Self-check FAILED: {msg}")
+            sys.exit(1)
+
+    def step(label, offered, tput, p95, err=0.0, burst=False):
+        return {"label": label, "offered_rps": offered, "throughput_rps": tput,
+                "p95_ms": p95, "error_rate": err, "completed": 0 if err >= 1 else 10,
+                "burst": burst}
+
+    check(percentile([], 95) == 0, "percentile of empty list")
+    check(percentile([5], 95) == 5, "percentile of one value")
+    check(percentile([1, 2, 3, 4], 50) == 2, "nearest-rank p50")
+    check(percentile(list(range(1, 101)), 95) == 95, "nearest-rank p95")
+    check([p["rps"] for p in ramp_profile(0, 4, 5, 10)] == [0, 1, 2, 3, 4], "ramp steps")
+
+    # Linear scaling, no knee: every step is sustainable
+    linear = [step("s1", 1, 1, 1000), step("s2", 2, 2, 1100), step("s3", 4, 3.9, 1200)]
+    check(detect_knee(linear) is None, "linear scaling has no knee")
+    check(capacity_report(linear, 5000, 0.02)["max_sustainable_step"] == "s3", "linear sustainable step")
+
+    # Throughput flattens and p95 jumps: knee at s3, even though s3 meets the SLO
+    flat = [step("s1", 1, 1, 1000), step("s2", 2, 2, 1100), step("s3", 4, 2.2, 2000)]
+    knee = detect_knee(flat)
+    check(knee and knee["label"] == "s3" and knee["trigger"] == "p95", "p95 knee at s3")
+    check(capacity_report(flat, 5000, 0.02)["max_sustainable_step"] == "s2", "sustainable stops before knee")
+
+    # Throughput flattens with only a small p95 bump: not a knee
+    check(detect_knee([step("s1", 1, 1, 1000), step("s2", 2, 1.2, 1200)]) is None, "small p95 bump is no knee")
+
+    # Every request fails: p95 is 0, error jump must still flag the knee
+    errors = [step("s1", 1, 1, 1000), step("s2", 2, 2, 1100), step("s3", 4, 0, 0, err=1.0)]
+    knee = detect_knee(errors)
+    check(knee and knee["label"] == "s3" and knee["trigger"] == "errors", "all-errors knee at s3")
+    check(capacity_report(errors, 5000, 0.02)["max_sustainable_step"] == "s2", "all-errors sustainable step")
+
+    # Spike: recovery is skipped for the knee, spike never counts as sustainable
+    spike = [step("baseline", 1, 1, 1000), step("spike", 6, 5.8, 1200, burst=True),
+             step("recovery", 1, 0.2, 9000, err=0.5)]
+    check(detect_knee(spike) is None, "spike recovery is not a knee")
+    check(capacity_report(spike, 5000, 0.02)["max_sustainable_step"] == "baseline", "spike is not sustainable")
+
+    # No step meets the SLO
+    check(capacity_report(linear, 500, 0.02)["max_sustainable_rps"] == 0, "no step meets SLO")
+
+    # Real run_step timing against a fixed-latency stub backend
+    real_send_query = send_query
+    send_query = lambda query_text: (time.sleep(0.3), {"_latency_ms": 300})[1]
+    try:
+        # Unlimited backend: throughput tracks offered load, no knee.
+        # 2.6 RPS x 1s rounds to 3 requests and must report 3 RPS offered.
+        steps = run_load(ramp_profile(2.6, 8, 3, 1), QUERIES, 64, [])
+        check(steps[0]["sent"] == 3 and steps[0]["offered_rps"] == 3, "offered rate uses rounded count")
+        for s in steps:
+            check(abs(s["throughput_rps"] - s["offered_rps"]) <= 0.1 * s["offered_rps"],
+                  f"{s['label']} throughput {s['throughput_rps']} vs offered {s['offered_rps']}")
+        check(detect_knee(steps) is None, "unsaturated ramp has no knee")
+
+        # One worker caps capacity at ~3.3 RPS: knee at the 10 RPS step
+        steps = run_load(step_profile([2, 10], 1), QUERIES, 1, [])
+        knee = detect_knee(steps)
+        check(knee and knee["label"] == "step-2", "saturated worker pool knee at step-2")
+        check(steps[1]["client_saturated"], "saturated step flags worker cap")
+    finally:
+        send_query = real_send_query
+
+    print("Self-check passed")
+
+
+def print_capacity(report):
+    """Print the capacity report table."""
+    print("\n" + "=" * 70)
+    print("COPILOT CAPACITY REPORT")
+    print("=" * 70)
+    print(f"{'Step':<12s} {'Offered':>8s} {'Tput':>7s} {'p50':>7s} {'p95':>7s} {'p99':>7s} {'Err%':>6s}")
+    print("-" * 60)
+    knee_label = report["knee"]["label"] if report["knee"] else None
+    for s in report["steps"]:
+        flag = " <<< knee" if s["label"] == knee_label else ""
+        if s.get("client_saturated"):
+            flag += " (worker cap)"
+        print(f"{s['label']:<12s} {s['offered_rps']:>8g} {s['throughput_rps']:>7g} "
+              f"{s['p50_ms']:>7d} {s['p95_ms']:>7d} {s['p99_ms']:>7d} "
+              f"{100*s['error_rate']:>5.1f}%{flag}")
+
+    slo = report["slo"]
+    print(f"\nSLO: p95 <= {slo['p95_ms']}ms, errors <= {100*slo['max_error_rate']:.1f}%")
+    print(f"Sustainable = {report['sustainable_rule']}")
+    if report["max_sustainable_step"]:
+        print(f"Max sustainable: {report['max_sustainable_rps']:g} RPS ({report['max_sustainable_step']})")
+    else:
+        print("Max sustainable: none - no step met the SLO")
+    if report["knee"]:
+        k = report["knee"]
+        growth = f"p95 x{k['p95_growth']:.2f}" if k["p95_growth"] is not None else "p95 n/a"
+        print(f"Knee: {k['label']} at {k['offered_rps']:g} RPS offered, {k['trigger']} "
+              f"(throughput scaling {k['scaling']:.2f}, {growth}, "
+              f"errors +{100*k['error_jump']:.1f}%)")
+    else:
+        print("Knee: not reached - raise --peak-rps to find saturation")
+    print("=" * 70)
+
+
+def save_capacity(report, profile_name):
+    """Save capacity report to JSON log file."""
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    ts = datetime.now().strftime("%Y%m%d-%H%M%S")
+    path = os.path.join(RESULTS_DIR, f"load-{profile_name}-{ts}.json")
+
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(dict(report, timestamp=ts, profile=profile_name, endpoint=ENDPOINT), f, indent=2)
+
+    print(f"\nCapacity report saved: {path}")
+    return path
+
+
 # -- Main ------------------------------------------------------------------
 
 def main():
@@ -590,8 +935,23 @@ def main():
     parser.add_argument("--failing", action="store_true", help="Re-run only previously failing queries")
     parser.add_argument("--delay", type=float, default=2.0, help="Seconds between requests (default 2.0)")
     parser.add_argument("--shuffle", action="store_true", help="Randomize query order")
+    parser.add_argument("--profile", choices=["ramp", "step", "spike"], help="Run a load profile instead of the test loop")
+    parser.add_argument("--start-rps", type=float, default=0.5, help="Ramp start / spike baseline RPS (default 0.5)")
+    parser.add_argument("--peak-rps", type=float, default=4.0, help="Ramp end / spike peak RPS (default 4.0)")
+    parser.add_argument("--steps", type=int, default=6, help="Number of ramp steps (default 6)")
+    parser.add_argument("--rps-steps", type=str, default="0.5,1,2,4", help="Comma-separated RPS plateaus for step profile")
+    parser.add_argument("--step-duration", type=int, default=STEP_DURATION, help=f"Seconds per step (default {STEP_DURATION})")
+    parser.add_argument("--slo-p95", type=int, default=SLO_P95_MS, help=f"p95 latency SLO in ms (default {SLO_P95_MS})")
+    parser.add_argument("--slo-errors", type=float, default=SLO_ERROR_RATE, help=f"Max error rate under SLO (default {SLO_ERROR_RATE})")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS, help=f"Max in-flight requests (default {MAX_WORKERS})")
+    parser.add_argument("--seed", type=int, default=LOAD_SEED, help=f"Query order seed for load profiles (default {LOAD_SEED})")
+    parser.add_argument("--self-check", action="store_true", help="Check knee/SLO logic on synthetic steps and exit")
     args = parser.parse_args()
 
+    if args.self_check:
+        self_check()
+        return
+
     global DELAY
     DELAY = args.delay
 
@@ -621,6 +981,42 @@ def main():
             print("No previous results found")
             sys.exit(1)
 
+    if args.profile:
+        if args.profile == "ramp":
+            profile = ramp_profile(args.start_rps, args.peak_rps, args.steps, args.step_duration)
+        elif args.profile == "step":
+            profile = step_profile([float(r) for r in args.rps_steps.split(",")], args.step_duration)
+        else:
+            profile = spike_profile(args.start_rps, args.peak_rps, args.step_duration)
+
+        bad = [p["rps"] for p in profile if p["rps"] <= 0]
+        if bad:
+            parser.error(f"every step needs RPS > 0, got {bad} (check --start-rps / --peak-rps / --rps-steps)")
+        if args.step_duration <= 0:
+            parser.error("--step-duration must be > 0")
+        if args.workers <= 0:
+            parser.error("--workers must be > 0")
+
+        total = sum(max(round(p["rps"] * p["duration"]), 1) for p in profile)
+        print(f"Copilot Load Profile: {args.profile}")
+        print(f"Endpoint: {ENDPOINT}")
+        print(f"Queries: {len(queries)} | Steps: {len(profile)} | Requests: {total} | Workers: {args.workers}")
+        print("=" * 70)
+
+        steps = []
+        try:
+            run_load(profile, queries, args.workers, steps, args.seed)
+        except KeyboardInterrupt:
+            print(f"\n\nInterrupted by user. Reporting {len(steps)}/{len(profile)} completed steps.")
+
+        if not steps:
+            sys.exit(1)
+
+        report = capacity_report(steps, args.slo_p95, args.slo_errors)
+        print_capacity(report)
+        save_capacity(report, args.profile)
+        return
+
     print("Copilot REPL Test Loop")
     print(f"Endpoint: {ENDPOINT}")
     print(f"Queries: {len(queries)} | Rounds: {'infinite' if args.loop == 0 else args.loop}")